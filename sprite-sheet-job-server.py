@@ -0,0 +1,452 @@
+""" Job server for distributing Sprite Sheet Render Toolkit renders across machines
+
+Serves (blend, target, direction, frame-range) render jobs over plain HTTP
+with json bodies. Workers lease a job, keep the lease alive with heartbeats
+and post back finished frames (or only their checksums). Leases that are not
+renewed in time are returned to the queue. Only needs python standard library.
+
+Usage:
+    python sprite-sheet-job-server.py serve [--host 0.0.0.0] [--port 8765] [--output ./job-output]
+    python sprite-sheet-job-server.py submit http://localhost:8765 --blend scene.blend --target Cube
+    python sprite-sheet-job-server.py status http://localhost:8765
+    python sprite-sheet-job-server.py dry-worker http://localhost:8765
+
+Blender workers run the addon file in worker mode:
+    blender -b scene.blend --python sprite-sheet-render-toolkit.py -- --sprshtt-worker http://localhost:8765
+
+`dry-worker` exercises the protocol without blender, several of them can be
+started next to a local server to test job distribution on one machine.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import hashlib
+import argparse
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+JOB_STATUS_PENDING = 'pending'
+JOB_STATUS_LEASED = 'leased'
+JOB_STATUS_DONE = 'done'
+JOB_STATUS_FAILED = 'failed'
+
+JOB_FIELDS = ('blend', 'target', 'direction', 'directions', 'frame_start', 'frame_end', 'frame_skip')
+
+# partial render metadata written by workers: {suffix}_d{direction}_f{frame start}.json / .aseprite.json
+METADATA_FRAGMENT_PATTERN = re.compile(r'^(?P<stem>.+)_d\d{2}_f\d{6}(?P<ext>\.aseprite\.json|\.json)$')
+
+
+def ls_job_frame_chunks(frame_start: int, frame_end: int, frame_skip: int, chunk: int) -> list:
+    """ Splits render frame range into (start, end) chunks of n rendered frames each
+
+    Follows render loop frames range(frame_start, frame_end, frame_skip), a
+    range rendering no frame yields no chunk, 0 chunk means whole range.
+    """
+    if frame_skip <= 0:
+        raise ValueError(f'frame_skip must be positive, got {frame_skip}')
+    if frame_end <= frame_start:
+        return []
+    if chunk <= 0:
+        return [(frame_start, frame_end)]
+    step = frame_skip * chunk
+    return [(start, min(frame_end, start + step)) for start in range(frame_start, frame_end, step)]
+
+def void_write_file_atomic(filepath: str, data: bytes):
+    """ Writes through temporary file so readers never see partial content """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(filepath + '.tmp', filepath)
+
+def void_merge_metadata_fragments(filepath: str, stem: str, ext: str):
+    """ Merges partial render metadata fragments in folder into {stem}{ext}
+
+    Frames are ordered by name (direction then frame), animation tags,
+    frame indices and pivot slice keys are rebuilt on merged order.
+    """
+    fragments = []
+    for filename in sorted(os.listdir(filepath)):
+        match = METADATA_FRAGMENT_PATTERN.match(filename)
+        if match and match.group('stem') == stem and match.group('ext') == ext:
+            with open(os.path.join(filepath, filename), 'r') as f:
+                fragments.append(json.load(f))
+    if not fragments:
+        return
+
+    meta = fragments[0]['meta']
+    records = {}
+    for fragment in fragments:
+        tags = fragment['meta'].get('frameTags', [])
+        slice_keys = {}
+        for item in fragment['meta'].get('slices', []):
+            for key in item['keys']:
+                slice_keys[key['frame']] = key
+        for i, (name, entry) in enumerate(fragment['frames'].items()):
+            tag = next((tag for tag in tags if tag['from'] <= i <= tag['to']), None)
+            records[name] = (entry, tag, slice_keys.get(i))
+        if 'directions' in fragment['meta']:
+            meta.setdefault('directions', {}).update(fragment['meta']['directions'])
+
+    names = sorted(records)
+    merged = {'frames': {name: records[name][0] for name in names}}
+
+    if ext == '.json':
+        animations = {}
+        for fragment in fragments:
+            for tag, tag_frames in fragment.get('animations', {}).items():
+                animations.setdefault(tag, set()).update(tag_frames)
+        merged['animations'] = {tag: sorted(animations[tag]) for tag in sorted(animations)}
+        meta['directions'] = dict(sorted(meta.get('directions', {}).items()))
+    else:
+        frame_tags = []
+        slice_keys = []
+        for i, name in enumerate(names):
+            _, tag, slice_key = records[name]
+            if tag is not None:
+                if frame_tags and frame_tags[-1]['name'] == tag['name']:
+                    frame_tags[-1]['to'] = i
+                else:
+                    frame_tags.append(dict(tag, **{'from': i, 'to': i}))
+            if slice_key is not None:
+                slice_keys.append(dict(slice_key, frame=i))
+        meta['frameTags'] = frame_tags
+        meta['slices'] = [dict(meta['slices'][0], keys=slice_keys)] if meta.get('slices') else []
+    merged['meta'] = meta
+
+    void_write_file_atomic(os.path.join(filepath, stem + ext), json.dumps(merged, indent=1).encode('utf-8'))
+
+
+class JobQueue:
+    """ Thread-safe render job queue with expiring leases """
+
+    def __init__(self, output_filepath: str, lease_timeout: float = 60, max_attempts: int = 3):
+        self.output_filepath = output_filepath
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._jobs = []
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+
+    def _void_expire_leases(self):
+        now = time.monotonic()
+        for lease_id, (job, expires) in list(self._leases.items()):
+            if expires < now:
+                del self._leases[lease_id]
+                self._void_requeue(job, 'lease expired')
+
+    def _void_requeue(self, job: dict, error: str):
+        job['attempts'] += 1
+        job['error'] = error
+        job['worker'] = None
+        job['status'] = JOB_STATUS_FAILED if job['attempts'] >= self.max_attempts else JOB_STATUS_PENDING
+
+    def _i_remaining(self) -> int:
+        return sum(job['status'] in (JOB_STATUS_PENDING, JOB_STATUS_LEASED) for job in self._jobs)
+
+    def ls_submit(self, jobs: list) -> list:
+        """ Queues jobs, items with a 'chunk' field are split into jobs of n rendered frames """
+        expanded = []
+        for item in jobs:
+            missing = [field for field in JOB_FIELDS if field not in item]
+            if missing:
+                raise ValueError(f'job is missing fields: {", ".join(missing)}')
+            chunks = ls_job_frame_chunks(item['frame_start'], item['frame_end'], item['frame_skip'], item.get('chunk', 0))
+            for frame_start, frame_end in chunks:
+                job = {field: item[field] for field in JOB_FIELDS}
+                job.update({'frame_start': frame_start, 'frame_end': frame_end})
+                expanded.append(job)
+
+        ids = []
+        with self._lock:
+            for job in expanded:
+                job.update({
+                    'id': len(self._jobs),
+                    'status': JOB_STATUS_PENDING,
+                    'attempts': 0,
+                    'worker': None,
+                    'error': None,
+                    'frames': {},
+                })
+                self._jobs.append(job)
+                ids.append(job['id'])
+        return ids
+
+    def dict_lease(self, worker: str) -> dict:
+        with self._lock:
+            self._void_expire_leases()
+            for job in self._jobs:
+                if job['status'] == JOB_STATUS_PENDING:
+                    lease_id = uuid.uuid4().hex
+                    job['status'] = JOB_STATUS_LEASED
+                    job['worker'] = worker
+                    self._leases[lease_id] = (job, time.monotonic() + self.lease_timeout)
+                    return {
+                        'job': {field: job[field] for field in ('id',) + JOB_FIELDS},
+                        'lease_id': lease_id,
+                        'lease_timeout': self.lease_timeout,
+                        'remaining': self._i_remaining(),
+                    }
+            return {'job': None, 'remaining': self._i_remaining(), 'retry_after': min(5, self.lease_timeout / 3)}
+
+    def b_heartbeat(self, lease_id: str) -> bool:
+        with self._lock:
+            self._void_expire_leases()
+            if lease_id not in self._leases:
+                return False
+            job, _ = self._leases[lease_id]
+            self._leases[lease_id] = (job, time.monotonic() + self.lease_timeout)
+            return True
+
+    def b_complete(self, lease_id: str, frames: list) -> bool:
+        """ Verifies and stores finished frames, returns False on stale lease
+
+        Frames are verified before the lease is released, a bad upload
+        returns the job to the queue and raises.
+        """
+        with self._lock:
+            self._void_expire_leases()
+            if lease_id not in self._leases:
+                return False
+
+        job = None
+        try:
+            checksums = {}
+            uploads = []
+            for frame in frames:
+                name, checksum = frame['name'], frame['sha256']
+                if 'data' in frame:
+                    data = base64.b64decode(frame['data'])
+                    if hashlib.sha256(data).hexdigest() != checksum:
+                        raise ValueError(f'checksum mismatch on {name}')
+                    uploads.append((self.s_frame_filepath(name), data))
+                checksums[name] = checksum
+
+            with self._lock:
+                if lease_id not in self._leases:
+                    return False
+                job, _ = self._leases.pop(lease_id)
+
+            with self._merge_lock:
+                for frame_filepath, data in uploads:
+                    void_write_file_atomic(frame_filepath, data)
+        except Exception as e:
+            with self._lock:
+                if lease_id in self._leases:
+                    job, _ = self._leases.pop(lease_id)
+                if job is not None and job['status'] == JOB_STATUS_LEASED:
+                    self._void_requeue(job, str(e))
+            raise
+
+        with self._lock:
+            job['frames'] = checksums
+            job['status'] = JOB_STATUS_DONE
+
+        fragments = set()
+        for frame_filepath, _ in uploads:
+            match = METADATA_FRAGMENT_PATTERN.match(os.path.basename(frame_filepath))
+            if match:
+                fragments.add((os.path.dirname(frame_filepath), match.group('stem'), match.group('ext')))
+        with self._merge_lock:
+            for filepath, stem, ext in sorted(fragments):
+                # frames are already stored, a failed merge must not fail the job
+                try:
+                    void_merge_metadata_fragments(filepath, stem, ext)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f'WARNING: Could not merge metadata {os.path.join(filepath, stem + ext)}: {e}')
+        return True
+
+    def b_fail(self, lease_id: str, error: str) -> bool:
+        with self._lock:
+            if lease_id not in self._leases:
+                return False
+            job, _ = self._leases.pop(lease_id)
+            self._void_requeue(job, error)
+            return True
+
+    def s_frame_filepath(self, name: str) -> str:
+        """ Resolves worker supplied frame name inside output folder """
+        name = os.path.normpath(name.replace('/', os.path.sep))
+        if os.path.isabs(name) or name.startswith(os.pardir):
+            raise ValueError(f'invalid frame name {name}')
+        return os.path.join(self.output_filepath, name)
+
+    def dict_status(self) -> dict:
+        with self._lock:
+            self._void_expire_leases()
+            counts = {status: 0 for status in (JOB_STATUS_PENDING, JOB_STATUS_LEASED, JOB_STATUS_DONE, JOB_STATUS_FAILED)}
+            for job in self._jobs:
+                counts[job['status']] += 1
+            jobs = [
+                {key: value for key, value in job.items() if key != 'frames'}
+                for job in self._jobs
+            ]
+            return {'counts': counts, 'remaining': self._i_remaining(), 'jobs': jobs}
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """ Routes json requests onto server job queue """
+
+    def _void_respond(self, code: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._void_respond(200, self.server.job_queue.dict_status())
+        else:
+            self._void_respond(404, {'error': f'unknown route {self.path}'})
+
+    def do_POST(self):
+        queue = self.server.job_queue
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/jobs':
+                self._void_respond(200, {'ids': queue.ls_submit(payload['jobs'])})
+            elif self.path == '/lease':
+                self._void_respond(200, queue.dict_lease(payload.get('worker', self.client_address[0])))
+            elif self.path == '/heartbeat':
+                b_ok = queue.b_heartbeat(payload['lease_id'])
+                self._void_respond(200 if b_ok else 409, {'ok': b_ok})
+            elif self.path == '/complete':
+                b_ok = queue.b_complete(payload['lease_id'], payload.get('frames', []))
+                self._void_respond(200 if b_ok else 409, {'ok': b_ok})
+            elif self.path == '/fail':
+                b_ok = queue.b_fail(payload['lease_id'], payload.get('error', ''))
+                self._void_respond(200 if b_ok else 409, {'ok': b_ok})
+            else:
+                self._void_respond(404, {'error': f'unknown route {self.path}'})
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            # malformed payload
+            self._void_respond(400, {'error': f'{type(e).__name__}: {e}'})
+        except OSError as e:
+            self._void_respond(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def var_make_server(host: str, port: int, job_queue: JobQueue, verbose: bool = False):
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.daemon_threads = True
+    server.job_queue = job_queue
+    server.verbose = verbose
+    return server
+
+
+# Command line
+
+def var_request(server_url: str, route: str, payload: dict = None):
+    data = None if payload is None else json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(server_url.rstrip('/') + route, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def void_cmd_serve(args):
+    os.makedirs(args.output, exist_ok=True)
+    job_queue = JobQueue(os.path.abspath(args.output), args.lease_timeout, args.max_attempts)
+    server = var_make_server(args.host, args.port, job_queue, args.verbose)
+    print(f'Serving render jobs on http://{args.host}:{server.server_address[1]}, output in {job_queue.output_filepath}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def void_cmd_submit(args):
+    jobs = [
+        {
+            'blend': os.path.abspath(args.blend),
+            'target': args.target,
+            'direction': direction,
+            'directions': args.directions,
+            'frame_start': args.frame_start,
+            'frame_end': args.frame_end,
+            'frame_skip': args.frame_skip,
+            'chunk': args.chunk,
+        }
+        for direction in range(args.directions)
+    ]
+    response = var_request(args.url, '/jobs', {'jobs': jobs})
+    print(f'Submitted {len(response["ids"])} jobs')
+
+def void_cmd_status(args):
+    print(json.dumps(var_request(args.url, '/status')['counts']))
+
+def void_cmd_dry_worker(args):
+    """ Leases jobs and completes them with placeholder frames, without rendering """
+    worker = args.name or f'dry-worker-{os.getpid()}'
+    while True:
+        response = var_request(args.url, '/lease', {'worker': worker})
+        job = response['job']
+        if job is None:
+            if response['remaining'] == 0:
+                return
+            time.sleep(response['retry_after'])
+            continue
+        frames = []
+        frame = job['frame_start']
+        while frame < job['frame_end']:
+            frame += job['frame_skip']
+            time.sleep(args.delay)
+            var_request(args.url, '/heartbeat', {'lease_id': response['lease_id']})
+            data = f'{job["target"]}:{job["direction"]}:{frame}'.encode('utf-8')
+            frames.append({
+                'name': f'{job["target"]}/d{job["direction"] * 360 // job["directions"]:03}_{job["target"]}/f{frame:06}.txt',
+                'sha256': hashlib.sha256(data).hexdigest(),
+                'data': base64.b64encode(data).decode('ascii'),
+            })
+        var_request(args.url, '/complete', {'lease_id': response['lease_id'], 'frames': frames})
+        print(f'{worker}: completed job {job["id"]} ({len(frames)} frames)')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sprite Sheet Render Toolkit job server')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_serve = subparsers.add_parser('serve', help='run job server')
+    parser_serve.add_argument('--host', default='0.0.0.0')
+    parser_serve.add_argument('--port', type=int, default=8765)
+    parser_serve.add_argument('--output', default='job-output', help='folder receiving finished frames')
+    parser_serve.add_argument('--lease-timeout', type=float, default=60, help='seconds before unrenewed lease expires')
+    parser_serve.add_argument('--max-attempts', type=int, default=3, help='attempts before job is marked failed')
+    parser_serve.add_argument('--verbose', action='store_true')
+    parser_serve.set_defaults(func=void_cmd_serve)
+
+    parser_submit = subparsers.add_parser('submit', help='submit render jobs')
+    parser_submit.add_argument('url')
+    parser_submit.add_argument('--blend', required=True)
+    parser_submit.add_argument('--target', required=True)
+    parser_submit.add_argument('--directions', type=int, default=8)
+    parser_submit.add_argument('--frame-start', type=int, default=1)
+    parser_submit.add_argument('--frame-end', type=int, default=250)
+    parser_submit.add_argument('--frame-skip', type=int, default=1)
+    parser_submit.add_argument('--chunk', type=int, default=0, help='rendered frames per job, 0 for whole direction')
+    parser_submit.set_defaults(func=void_cmd_submit)
+
+    parser_status = subparsers.add_parser('status', help='print job counts')
+    parser_status.add_argument('url')
+    parser_status.set_defaults(func=void_cmd_status)
+
+    parser_dry_worker = subparsers.add_parser('dry-worker', help='run protocol-only worker without blender')
+    parser_dry_worker.add_argument('url')
+    parser_dry_worker.add_argument('--name', default='')
+    parser_dry_worker.add_argument('--delay', type=float, default=0.01, help='fake seconds per frame')
+    parser_dry_worker.set_defaults(func=void_cmd_dry_worker)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,17 @@ bl_info = {
 import bpy
 import os
 import sys
+import shutil
+import socket
+import tempfile
+import json
+import base64
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+import numpy as np
+from time import perf_counter, sleep
 from random import getrandbits
 from bpy.types import (
     Scene,
@@ -35,6 +46,7 @@ from bpy.path import (
     clean_name,
     native_pathsep
 )
+from bpy_extras.object_utils import world_to_camera_view
 from mathutils import (
     Vector,
     Matrix,
@@ -43,6 +55,8 @@ from mathutils import (
 from math import (
     pi,
     log2,
+    floor,
+    ceil,
     isclose,
     radians
 )
@@ -112,6 +126,44 @@ def void_delete_objects_from_scene(objs: list):
 def void_delete_objects_with_prefix(prefix: str):
     void_delete_objects_from_scene(ls_objects_with_prefix(prefix))
 
+def ls_save_attributes(pairs: list) -> list:
+    """ Saves (data, attribute name) pairs values to be restored later """
+    return [(data, attr, getattr(data, attr)) for data, attr in pairs]
+
+def void_load_attributes(saved: list):
+    """ Restores values saved by ls_save_attributes """
+    for data, attr, value in saved:
+        setattr(data, attr, value)
+
+def ls_key_frames(frame_start: int, frame_end: int, frame_skip: int, n: int) -> list:
+    """ Picks n evenly spaced frames out of frames the render loop renders """
+    frames = list(range(frame_start, frame_end, frame_skip))
+    if len(frames) <= n:
+        return frames
+    if n <= 1:
+        return frames[:1]
+    return [frames[round(i * (len(frames) - 1) / (n - 1))] for i in range(n)]
+
+def arr_load_image_pixels(filepath: str):
+    """ Loads image file into (height, width, 4) float array, bottom row first """
+    img = bpy.data.images.load(filepath)
+    width, height = img.size
+    if hasattr(img.pixels, 'foreach_get'):
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+    else:
+        pixels = np.array(img.pixels[:], dtype=np.float32)
+    bpy.data.images.remove(img)
+    return pixels.reshape(height, width, 4)
+
+def void_set_image_pixels(img, pixels):
+    """ Writes (height, width, 4) float array, bottom row first, into image """
+    pixels = np.ascontiguousarray(pixels, dtype=np.float32).ravel()
+    if hasattr(img.pixels, 'foreach_set'):
+        img.pixels.foreach_set(pixels)
+    else:
+        img.pixels[:] = pixels.tolist()
+
 def var_decompose_object_bbox_dim(obj: BObject):
     """ Calculates relative bounding box dimension """
     rot = obj.rotation_euler.copy()
@@ -280,6 +332,704 @@ class ObjectSelectionStateSaver:
             context.view_layer.objects.active = ObjectSelectionStateSaver._selections[0]
             ObjectSelectionStateSaver._selections.clear()
 
+
+class CompositorPassOutputs:
+    """ Writes extra render passes through a compositor File Output node
+
+    Passes are enabled on the view layer once and written by a single File
+    Output node, so one `bpy.ops.render.render` call produces the colour
+    sprite and every requested pass. The node writes into a staging folder,
+    from which each pass is moved next to the colour sprite.
+    """
+
+    # pass name: (view layer attribute, render layers output socket names)
+    PASS_SETTINGS = {
+        'normal':   ('use_pass_normal', ('Normal',)),
+        'depth':    ('use_pass_z', ('Depth', 'Z')),
+        'emission': ('use_pass_emit', ('Emit',)),
+        'idmask':   ('use_pass_object_index', ('IndexOB',)),
+    }
+
+    # passes holding non-colour data, written without scene view transform
+    DATA_PASSES = ('normal', 'depth', 'idmask')
+
+    def __init__(self, context, pass_names: list, target_object: BObject, staging_filepath: str):
+        self.scene = context.scene
+        self.view_layer = context.view_layer
+        self.pass_names = [name for name in pass_names if name in self.PASS_SETTINGS]
+        self.target_object = target_object
+        self.staging_filepath = staging_filepath
+        self.node_prefix = s_get_addon_object_prefix('pass')
+        self._saved_use_nodes = None
+        self._saved_use_compositing = None
+        self._saved_pass_flags = {}
+        self._saved_pass_index = None
+        self._nodes = []
+
+    def _node_new(self, node_type: str, location=(0, 0)):
+        node = self.scene.node_tree.nodes.new(node_type)
+        node.name = self.node_prefix + node_type
+        node.location = location
+        self._nodes.append(node)
+        return node
+
+    def _node_render_layers(self):
+        for node in self.scene.node_tree.nodes:
+            if node.type == 'R_LAYERS' and node.layer == self.view_layer.name:
+                return node
+        node = self._node_new('CompositorNodeRLayers', (-400, 0))
+        node.layer = self.view_layer.name
+        return node
+
+    @staticmethod
+    def _b_set_data_format(slot, image_settings) -> bool:
+        """ Writes slot as raw data, falls back onto float EXR if format has no colour management override """
+        slot.use_node_format = False
+        slot.format.file_format = image_settings.file_format
+        slot.format.color_mode = image_settings.color_mode
+        slot.format.color_depth = image_settings.color_depth
+        if hasattr(slot.format, 'color_management'):
+            slot.format.color_management = 'OVERRIDE'
+            slot.format.view_settings.view_transform = 'Raw'
+            slot.format.view_settings.look = 'None'
+            slot.format.view_settings.exposure = 0
+            slot.format.view_settings.gamma = 1
+            return True
+        slot.format.file_format = 'OPEN_EXR'
+        slot.format.color_mode = 'RGBA'
+        slot.format.color_depth = '32'
+        return False
+
+    @staticmethod
+    def _socket_find(sockets, names):
+        for name in names:
+            if name in sockets and sockets[name].enabled:
+                return sockets[name]
+        return None
+
+    def ls_setup(self) -> list:
+        """ Enables passes and builds the output node, returns warning messages """
+        scene = self.scene
+        self._saved_use_nodes = scene.use_nodes
+        scene.use_nodes = True
+        self._saved_use_compositing = scene.render.use_compositing
+        scene.render.use_compositing = True
+        links = scene.node_tree.links
+
+        for name in self.pass_names:
+            attr = self.PASS_SETTINGS[name][0]
+            if hasattr(self.view_layer, attr):
+                self._saved_pass_flags[attr] = getattr(self.view_layer, attr)
+                setattr(self.view_layer, attr, True)
+
+        if 'idmask' in self.pass_names:
+            # mask needs an index no other object in scene shares with target
+            other_indices = {obj.pass_index for obj in scene.objects if obj != self.target_object}
+            if self.target_object.pass_index == 0 or self.target_object.pass_index in other_indices:
+                self._saved_pass_index = self.target_object.pass_index
+                self.target_object.pass_index = max(other_indices | {0}) + 1
+
+        # leftovers from an interrupted run would be picked up as current frame passes
+        shutil.rmtree(self.staging_filepath, ignore_errors=True)
+
+        render_layers = self._node_render_layers()
+        alpha_socket = self._socket_find(render_layers.outputs, ('Alpha',))
+
+        output_node = self._node_new('CompositorNodeOutputFile', (600, 0))
+        output_node.base_path = self.staging_filepath
+        output_node.format.file_format = scene.render.image_settings.file_format
+        output_node.format.color_mode = scene.render.image_settings.color_mode
+        output_node.format.color_depth = scene.render.image_settings.color_depth
+        output_node.file_slots.clear()
+
+        warnings = []
+        for i, name in enumerate(self.pass_names):
+            socket = self._socket_find(render_layers.outputs, self.PASS_SETTINGS[name][1])
+            if socket is None:
+                warnings.append(f'Render pass not supported by {scene.render.engine}: {name}')
+                continue
+            y = -200 * i
+
+            if name == 'normal':
+                # remaps [-1, 1] normal vector into [0, 1] colour range
+                node_mul = self._node_new('CompositorNodeMixRGB', (0, y))
+                node_mul.blend_type = 'MULTIPLY'
+                node_mul.inputs[2].default_value = (.5, .5, .5, 1)
+                node_add = self._node_new('CompositorNodeMixRGB', (200, y))
+                node_add.blend_type = 'ADD'
+                node_add.inputs[2].default_value = (.5, .5, .5, 1)
+                links.new(socket, node_mul.inputs[1])
+                links.new(node_mul.outputs[0], node_add.inputs[1])
+                socket = node_add.outputs[0]
+
+            elif name == 'depth':
+                # maps camera clipping range into [1, 0], consistent across frames
+                camera_data = scene.camera.data
+                node_map = self._node_new('CompositorNodeMapRange', (0, y))
+                node_map.use_clamp = True
+                node_map.inputs['From Min'].default_value = camera_data.clip_start
+                node_map.inputs['From Max'].default_value = camera_data.clip_end
+                node_map.inputs['To Min'].default_value = 1
+                node_map.inputs['To Max'].default_value = 0
+                links.new(socket, node_map.inputs[0])
+                socket = node_map.outputs[0]
+
+            elif name == 'idmask':
+                node_mask = self._node_new('CompositorNodeIDMask', (0, y))
+                node_mask.index = self.target_object.pass_index
+                node_mask.use_antialiasing = True
+                links.new(socket, node_mask.inputs[0])
+                socket = node_mask.outputs[0]
+
+            if name != 'idmask' and alpha_socket is not None:
+                node_alpha = self._node_new('CompositorNodeSetAlpha', (400, y))
+                links.new(socket, node_alpha.inputs['Image'])
+                links.new(alpha_socket, node_alpha.inputs['Alpha'])
+                socket = node_alpha.outputs[0]
+
+            output_node.file_slots.new(name + '_')
+            links.new(socket, output_node.inputs[-1])
+            if name in self.DATA_PASSES and not self._b_set_data_format(output_node.file_slots[-1], scene.render.image_settings):
+                warnings.append(f'Colour management override not available, writing {name} pass as OpenEXR')
+
+        return warnings
+
+    def ls_move_outputs(self, target_filepath: str, target_filestem: str) -> list:
+        """ Moves passes written by last render into target path as {stem}_{pass}.ext, returns moved file paths """
+        moved = []
+        if not os.path.isdir(self.staging_filepath):
+            return moved
+        for filename in os.listdir(self.staging_filepath):
+            for name in self.pass_names:
+                if filename.startswith(name + '_'):
+                    _, ext = os.path.splitext(filename)
+                    pass_filepath = os.path.join(target_filepath, f'{target_filestem}_{name}{ext}')
+                    os.replace(os.path.join(self.staging_filepath, filename), pass_filepath)
+                    moved.append(pass_filepath)
+                    break
+        return moved
+
+    def void_teardown(self):
+        """ Removes addon nodes and restores scene state """
+        scene = self.scene
+        if scene.node_tree:
+            for node in self._nodes:
+                scene.node_tree.nodes.remove(node)
+        self._nodes.clear()
+        for attr, value in self._saved_pass_flags.items():
+            setattr(self.view_layer, attr, value)
+        self._saved_pass_flags.clear()
+        if self._saved_pass_index is not None:
+            self.target_object.pass_index = self._saved_pass_index
+            self._saved_pass_index = None
+        if self._saved_use_nodes is not None:
+            scene.use_nodes = self._saved_use_nodes
+            self._saved_use_nodes = None
+        if self._saved_use_compositing is not None:
+            scene.render.use_compositing = self._saved_use_compositing
+            self._saved_use_compositing = None
+        if os.path.isdir(self.staging_filepath) and not os.listdir(self.staging_filepath):
+            os.rmdir(self.staging_filepath)
+
+
+def arr_tile_view(pixels, tile_size: int):
+    """ Pads (height, width, channels) array to tile size multiple, returns it with (th, ts, tw, ts, channels) view """
+    height, width, channels = pixels.shape
+    tiles_y, tiles_x = -(-height // tile_size), -(-width // tile_size)
+    padded = np.zeros((tiles_y * tile_size, tiles_x * tile_size, channels), dtype=pixels.dtype)
+    padded[:height, :width] = pixels
+    return padded, padded.reshape(tiles_y, tile_size, tiles_x, tile_size, channels)
+
+def var_diff_tiles(prev_pixels, pixels, tile_size: int):
+    """ Returns flat indices of changed tiles and their (n, ts, ts, channels) content """
+    _, prev_view = arr_tile_view(prev_pixels, tile_size)
+    _, view = arr_tile_view(pixels, tile_size)
+    changed = (prev_view != view).any(axis=(1, 3, 4))
+    tile_ids = np.flatnonzero(changed).astype(np.uint32)
+    tiles_y, tiles_x = np.divmod(tile_ids, changed.shape[1])
+    return tile_ids, view[tiles_y, :, tiles_x]
+
+def arr_decode_delta_frame(filepath: str, frame_name: str):
+    """ Rebuilds a frame stored by DeltaFrameEncoder as (height, width, channels) uint8 array, top row first
+
+    Only the nearest preceding keyframe and the tiles changed since are read.
+    """
+    with open(os.path.join(filepath, DeltaFrameEncoder.INDEX_FILENAME), 'r') as f:
+        index = json.load(f)
+    tile_size = index['tile_size']
+    names = [item['name'] for item in index['frames']]
+    pos = names.index(frame_name)
+    key_pos = pos
+    while not index['frames'][key_pos]['keyframe']:
+        key_pos -= 1
+
+    with np.load(os.path.join(filepath, names[key_pos] + '.npz')) as data:
+        pixels = data['pixels']
+    height, width, _ = pixels.shape
+    padded, view = arr_tile_view(pixels, tile_size)
+    tiles_x = view.shape[2]
+    for name in names[key_pos + 1:pos + 1]:
+        with np.load(os.path.join(filepath, name + '.npz')) as data:
+            tiles_y, tile_x = np.divmod(data['tile_ids'], tiles_x)
+            view[tiles_y, :, tile_x] = data['tiles']
+    return padded[:height, :width].copy()
+
+
+class DeltaFrameEncoder:
+    """ Stores a frame sequence as keyframes and changed tiles in between
+
+    Every keyframe_interval-th frame is stored whole, other frames only store
+    the tiles that differ from the previous frame. Frames are written as
+    {name}.npz next to an index file listing the sequence.
+    """
+
+    INDEX_FILENAME = 'delta_index.json'
+
+    def __init__(self, filepath: str, tile_size: int = 16, keyframe_interval: int = 8):
+        self.filepath = filepath
+        self.tile_size = tile_size
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._prev_pixels = None
+        self._frames = []
+
+    def void_push_frame(self, frame_name: str, pixels):
+        """ Encodes (height, width, channels) uint8 array as next frame in sequence """
+        b_keyframe = self._prev_pixels is None \
+            or self._prev_pixels.shape != pixels.shape \
+            or len(self._frames) % self.keyframe_interval == 0
+        frame_filepath = os.path.join(self.filepath, frame_name + '.npz')
+        if b_keyframe:
+            np.savez_compressed(frame_filepath, pixels=pixels)
+            n_tiles = -1
+        else:
+            tile_ids, tiles = var_diff_tiles(self._prev_pixels, pixels, self.tile_size)
+            np.savez_compressed(frame_filepath, tile_ids=tile_ids, tiles=tiles)
+            n_tiles = len(tile_ids)
+        self._frames.append({'name': frame_name, 'keyframe': b_keyframe, 'tiles': n_tiles})
+        self._prev_pixels = pixels
+
+    def void_close(self):
+        """ Writes sequence index file """
+        with open(os.path.join(self.filepath, self.INDEX_FILENAME), 'w') as f:
+            json.dump({
+                'tile_size': self.tile_size,
+                'keyframe_interval': self.keyframe_interval,
+                'frames': self._frames,
+            }, f, indent=1)
+        self._prev_pixels = None
+        self._frames = []
+
+
+def var_project_object_sprite_rect(scene, obj: BObject, width: int, height: int):
+    """ Projects evaluated object bounding box onto scene camera
+
+    Returns trimmed (x, y, w, h) pixel rect and (x, y) pivot normalized to image
+    size, both with origin on top-left, without reading rendered image.
+    """
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    obj_eval = obj.evaluated_get(depsgraph)
+    camera = scene.camera
+    corners = [
+        world_to_camera_view(scene, camera, obj_eval.matrix_world @ Vector(corner))
+        for corner in obj_eval.bound_box
+    ]
+    corners = [c for c in corners if c.z > 0] or corners
+    clamp = lambda v, max_v: min(max(v, 0), max_v)
+    x0 = clamp(floor(min(c.x for c in corners) * width), width - 1)
+    x1 = clamp(ceil(max(c.x for c in corners) * width), width)
+    y0 = clamp(floor((1 - max(c.y for c in corners)) * height), height - 1)
+    y1 = clamp(ceil((1 - min(c.y for c in corners)) * height), height)
+    pivot = world_to_camera_view(scene, camera, obj_eval.matrix_world.translation)
+    return (x0, y0, max(1, x1 - x0), max(1, y1 - y0)), (pivot.x, 1 - pivot.y)
+
+
+class SpriteMetadataWriter:
+    """ Streams per-frame sprite metadata as TexturePacker-hash or Aseprite json
+
+    Frame entries are written and flushed as soon as they are pushed, only
+    animation tags and pivots are kept until the file is closed. No atlas is
+    packed: each frame key is the path of its own image file relative to the
+    json file, and frame rect points at the trimmed region inside that image.
+    meta.image is therefore omitted, importers that expect a single atlas image
+    need the frames packed into a sheet first.
+    """
+
+    FORMATS = ('TEXTUREPACKER', 'ASEPRITE')
+
+    def __init__(self, filepath: str, file_format: str, source_size: tuple):
+        self.filepath = filepath
+        self.file_format = file_format
+        self.source_size = source_size
+        self._file = None
+        self._n_frames = 0
+        self._tags = []
+        self._slice_keys = []
+
+    def void_open(self):
+        self._file = open(self.filepath, 'w')
+        self._file.write('{"frames": {')
+        self._n_frames = 0
+
+    def void_push_frame(self, name: str, rect: tuple, pivot: tuple, duration: int, tag: str, angle: int):
+        """ Writes one frame entry, frames pushed under same tag form one animation """
+        x, y, w, h = rect
+        source_w, source_h = self.source_size
+        entry = {
+            'frame': {'x': x, 'y': y, 'w': w, 'h': h},
+            'rotated': False,
+            'trimmed': (w, h) != (source_w, source_h),
+            'spriteSourceSize': {'x': x, 'y': y, 'w': w, 'h': h},
+            'sourceSize': {'w': source_w, 'h': source_h},
+        }
+        if self.file_format == 'TEXTUREPACKER':
+            entry['pivot'] = {'x': round(pivot[0], 4), 'y': round(pivot[1], 4)}
+        else:
+            entry['duration'] = duration
+            self._slice_keys.append({
+                'frame': self._n_frames,
+                'bounds': {'x': x, 'y': y, 'w': w, 'h': h},
+                'pivot': {'x': round(pivot[0] * source_w) - x, 'y': round(pivot[1] * source_h) - y},
+            })
+
+        if self._tags and self._tags[-1]['name'] == tag:
+            self._tags[-1]['to'] = self._n_frames
+            self._tags[-1]['frames'].append(name)
+        else:
+            self._tags.append({'name': tag, 'from': self._n_frames, 'to': self._n_frames, 'angle': angle, 'frames': [name]})
+
+        self._file.write((',' if self._n_frames else '') + '\n ' + json.dumps(name) + ': ' + json.dumps(entry))
+        self._file.flush()
+        self._n_frames += 1
+
+    def void_close(self):
+        """ Writes animation tags and meta block then closes file """
+        source_w, source_h = self.source_size
+        meta = {
+            'app': 'https://github.com/previoip/blender-sprite-render-toolkit',
+            'version': '.'.join(str(v) for v in bl_info['version']),
+            'format': 'RGBA8888',
+            'size': {'w': source_w, 'h': source_h},
+            'scale': '1',
+        }
+        # no 'image' key, frame keys already name their image files
+        self._file.write('\n},\n')
+        if self.file_format == 'TEXTUREPACKER':
+            meta['directions'] = {tag['name']: tag['angle'] for tag in self._tags}
+            self._file.write('"animations": ' + json.dumps({tag['name']: tag['frames'] for tag in self._tags}) + ',\n')
+        else:
+            meta['frameTags'] = [
+                {'name': tag['name'], 'from': tag['from'], 'to': tag['to'], 'direction': 'forward', 'data': f'angle={tag["angle"]}'}
+                for tag in self._tags
+            ]
+            meta['layers'] = []
+            meta['slices'] = [{'name': 'pivot', 'color': '#0000ffff', 'keys': self._slice_keys}]
+        self._file.write('"meta": ' + json.dumps(meta) + '\n}\n')
+        self._file.close()
+        self._file = None
+        self._tags = []
+        self._slice_keys = []
+
+def set_render_directions(context, render_fp: str, increments, frame_start: int, frame_end: int, frame_skip: int, report, written: list = None):
+    """ Renders given camera increments into render_fp/{export folder}/{suffix}/d{angle}_{suffix}
+
+    Paths of every file written are appended onto written list if given.
+    """
+    if written is None:
+        written = []
+    scene = context.scene
+    addon_prop = scene.sprshtt_properties
+
+    target_name = addon_prop.collection_target_objects.name
+    render_subfolder = addon_prop.str_export_folder
+    render_file_suffix = addon_prop.str_file_suffix
+    render_file_format = scene.render.image_settings.file_format
+
+    bitmap_file_formats = ['PNG', 'BMP', 'JPEG', 'JPEG2000', 'TARGA', 'TARGA_RAW', 'IRIS']
+    if render_file_format not in bitmap_file_formats:
+        report({'INFO'}, f'File format not supported: {render_file_format}')
+        return {'CANCELLED'}
+
+    b_delta_codec = addon_prop.enum_frame_codec == 'DELTA'
+    if b_delta_codec and render_file_format != 'PNG':
+        report({'INFO'}, f'Delta tile storage requires PNG output, got: {render_file_format}')
+        return {'CANCELLED'}
+    if b_delta_codec and scene.render.image_settings.color_depth != '8':
+        # frames are stored as uint8, higher depth would be silently truncated
+        report({'INFO'}, f'Delta tile storage requires 8 bit PNG output, got: {scene.render.image_settings.color_depth} bit')
+        return {'CANCELLED'}
+
+    if not render_file_suffix:
+        render_file_suffix = target_name
+    render_file_suffix = clean_name(render_file_suffix)
+
+    if render_subfolder:
+        render_subfolder = native_pathsep(render_subfolder).lstrip(os.path.sep)
+        render_fp = os.path.join(render_fp, render_subfolder)
+        if not os.path.isdir(render_fp):
+            os.mkdir(render_fp)
+            report({'INFO'}, f'Created new folder {render_fp}')
+
+    render_sub_sub_folder = os.path.join(render_fp, render_file_suffix)
+    if not os.path.isdir(render_sub_sub_folder):
+        os.mkdir(render_sub_sub_folder)
+        report({'INFO'}, f'Created new folder {render_sub_sub_folder}')
+
+    pass_names = [
+        name for name, enabled in (
+            ('normal', addon_prop.bool_pass_normal),
+            ('depth', addon_prop.bool_pass_depth),
+            ('emission', addon_prop.bool_pass_emission),
+            ('idmask', addon_prop.bool_pass_id_mask),
+        ) if enabled
+    ]
+    pass_outputs = None
+    if pass_names:
+        pass_outputs = CompositorPassOutputs(
+            context,
+            pass_names,
+            addon_prop.collection_target_objects,
+            os.path.join(render_sub_sub_folder, '.sprshtt_passes')
+        )
+
+    metadata_writers = []
+    if addon_prop.bool_export_metadata:
+        render_scale = scene.render.resolution_percentage / 100
+        source_size = (int(scene.render.resolution_x * render_scale), int(scene.render.resolution_y * render_scale))
+        frame_duration = round(1000 * frame_skip * scene.render.fps_base / scene.render.fps)
+        increments = list(increments)
+        metadata_filestem = render_file_suffix
+        if increments != list(range(addon_prop.int_camera_rotation_increment_limit)) \
+                or (frame_start, frame_end) != (scene.frame_start, scene.frame_end):
+            # partial render (e.g. job worker), keeps metadata of other parts from being overwritten
+            metadata_filestem += f'_d{increments[0]:02}_f{frame_start:06}'
+        for file_format, ext in zip(SpriteMetadataWriter.FORMATS, ('.json', '.aseprite.json')):
+            writer = SpriteMetadataWriter(os.path.join(render_sub_sub_folder, metadata_filestem + ext), file_format, source_size)
+            writer.void_open()
+            metadata_writers.append(writer)
+
+    try:
+        if pass_outputs:
+            for message in pass_outputs.ls_setup():
+                report({'WARNING'}, message)
+
+        for inc in increments:
+            addon_prop.int_camera_rotation_preview = inc
+            curr_angle = inc*360//addon_prop.int_camera_rotation_increment_limit
+
+            render_sub_sub_sub_folder = os.path.join(render_sub_sub_folder, f'd{curr_angle:03}_{render_file_suffix}')
+
+            if not os.path.isdir(render_sub_sub_sub_folder):
+                os.mkdir(render_sub_sub_sub_folder)
+                report({'INFO'}, f'Created new folder {render_sub_sub_sub_folder}')
+
+            delta_encoder = None
+            if b_delta_codec:
+                delta_encoder = DeltaFrameEncoder(
+                    render_sub_sub_sub_folder,
+                    addon_prop.int_delta_tile_size,
+                    addon_prop.int_delta_keyframe_interval
+                )
+
+            frame = frame_start
+            while frame < frame_end:
+                scene.frame_current = frame
+                frame += frame_skip
+                filename = f'f{frame:06}.{render_file_format.lower()}'
+                render_to_path(context, render_sub_sub_sub_folder, filename)
+                if pass_outputs:
+                    written.extend(pass_outputs.ls_move_outputs(render_sub_sub_sub_folder, f'f{frame:06}'))
+                if metadata_writers:
+                    scene.frame_set(scene.frame_current)
+                    rect, pivot = var_project_object_sprite_rect(scene, addon_prop.collection_target_objects, *source_size)
+                    # delta storage removes rendered image, frames are referenced by their encoded file
+                    frame_ref = f'f{frame:06}.npz' if b_delta_codec else filename
+                    for writer in metadata_writers:
+                        writer.void_push_frame(
+                            f'd{curr_angle:03}_{render_file_suffix}/{frame_ref}',
+                            rect,
+                            pivot,
+                            frame_duration,
+                            f'd{curr_angle:03}_{render_file_suffix}',
+                            curr_angle
+                        )
+                if delta_encoder:
+                    image_filepath = os.path.join(render_sub_sub_sub_folder, filename)
+                    pixels = arr_load_image_pixels(image_filepath)[::-1]
+                    delta_encoder.void_push_frame(f'f{frame:06}', (pixels * 255).round().astype(np.uint8))
+                    os.remove(image_filepath)
+                    written.append(os.path.join(render_sub_sub_sub_folder, f'f{frame:06}.npz'))
+                else:
+                    written.append(os.path.join(render_sub_sub_sub_folder, filename))
+
+            if delta_encoder:
+                delta_encoder.void_close()
+                written.append(os.path.join(render_sub_sub_sub_folder, DeltaFrameEncoder.INDEX_FILENAME))
+    finally:
+        if pass_outputs:
+            pass_outputs.void_teardown()
+        for writer in metadata_writers:
+            writer.void_close()
+            written.append(writer.filepath)
+
+    return {'FINISHED'}
+
+
+# Render Job Worker
+
+def var_job_server_request(server_url: str, route: str, payload: dict = None):
+    """ Posts json payload onto job server route and returns decoded json response """
+    request = urllib.request.Request(
+        server_url.rstrip('/') + route,
+        data=json.dumps(payload or {}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def s_resolve_job_blend(job_blend: str, blend_root: str = '') -> str:
+    """ Resolves submitted blend path on this machine
+
+    The blend file already open is used when its file name matches, otherwise
+    the file is looked up by name under blend_root, or at the submitted path.
+    Returns empty string if no matching file is found.
+    """
+    blend_name = job_blend.replace('\\', '/').rsplit('/', 1)[-1]
+    if bpy.data.filepath and os.path.basename(bpy.data.filepath) == blend_name:
+        return abspath(bpy.data.filepath)
+    blend_filepath = os.path.join(blend_root, blend_name) if blend_root else os.path.normpath(job_blend)
+    if os.path.isfile(blend_filepath):
+        return blend_filepath
+    return ''
+
+def ls_collect_job_frames(render_fp: str, filepaths: list, b_checksums_only: bool = False) -> list:
+    """ Lists rendered files as job server frame entries named relative to render_fp
+
+    Metadata json files are always uploaded so server can merge partial render metadata.
+    """
+    frames = []
+    for frame_filepath in filepaths:
+        with open(frame_filepath, 'rb') as f:
+            data = f.read()
+        frame = {
+            'name': os.path.relpath(frame_filepath, render_fp).replace(os.path.sep, '/'),
+            'sha256': hashlib.sha256(data).hexdigest(),
+        }
+        if not b_checksums_only or frame_filepath.endswith('.json'):
+            frame['data'] = base64.b64encode(data).decode('ascii')
+        frames.append(frame)
+    return frames
+
+
+class JobLeaseHeartbeat(threading.Thread):
+    """ Keeps a job lease alive while the main thread is busy rendering """
+
+    def __init__(self, server_url: str, lease_id: str, interval: float):
+        super().__init__(daemon=True)
+        self.server_url = server_url
+        self.lease_id = lease_id
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                var_job_server_request(self.server_url, '/heartbeat', {'lease_id': self.lease_id})
+            except (urllib.error.URLError, OSError) as e:
+                print(f'WARNING: Heartbeat failed for lease {self.lease_id}: {e}')
+
+    def void_stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def void_run_job_worker(server_url: str, worker_name: str = '', b_checksums_only: bool = False, blend_root: str = '', max_retries: int = 3):
+    """ Pulls render jobs from job server until no job is left
+
+    Meant to run inside headless blender, e.g.
+    blender -b scene.blend --python sprite-sheet-render-toolkit.py -- --sprshtt-worker http://host:8765
+
+    Frames are rendered into a temporary folder and uploaded, or with
+    b_checksums_only rendered into the blend render output (shared storage)
+    and only reported by checksum. Job blend files are matched by file name,
+    see s_resolve_job_blend.
+    """
+    if not worker_name:
+        worker_name = f'{socket.gethostname()}-{os.getpid()}'
+    report = lambda level, message: print(f'{"/".join(level)}: {message}')
+    retries = 0
+
+    while True:
+        try:
+            response = var_job_server_request(server_url, '/lease', {'worker': worker_name})
+            retries = 0
+        except (urllib.error.URLError, OSError) as e:
+            retries += 1
+            if retries > max_retries:
+                print(f'WARNING: Job server {server_url} unreachable, stopping worker: {e}')
+                return
+            sleep(2 ** retries)
+            continue
+
+        job = response['job']
+        if job is None:
+            if response['remaining'] == 0:
+                print(f'INFO: No jobs left on {server_url}, stopping worker {worker_name}.')
+                return
+            sleep(response.get('retry_after', 2))
+            continue
+
+        lease_id = response['lease_id']
+        heartbeat = JobLeaseHeartbeat(server_url, lease_id, response['lease_timeout'] / 3)
+        heartbeat.start()
+        tmp_filepath = None
+        try:
+            blend_filepath = s_resolve_job_blend(job['blend'], blend_root)
+            if not blend_filepath:
+                raise RuntimeError(f'blend file not found on worker: {job["blend"]}')
+            b_blend_open = lambda: os.path.normcase(os.path.normpath(abspath(bpy.data.filepath))) == os.path.normcase(os.path.normpath(blend_filepath))
+            if not b_blend_open():
+                bpy.ops.wm.open_mainfile(filepath=blend_filepath)
+            if not b_blend_open():
+                raise RuntimeError(f'could not open blend file {blend_filepath}, open file is {bpy.data.filepath}')
+
+            context = bpy.context
+            addon_prop = context.scene.sprshtt_properties
+            addon_prop.collection_target_objects = bpy.data.objects[job['target']]
+            addon_prop.int_camera_rotation_increment_limit = job['directions']
+
+            if b_checksums_only:
+                render_fp = native_pathsep(abspath(context.scene.render.filepath))
+            else:
+                render_fp = tmp_filepath = tempfile.mkdtemp(prefix='sprshtt_job_')
+
+            written = []
+            result = set_render_directions(
+                context,
+                render_fp,
+                [job['direction']],
+                job['frame_start'],
+                job['frame_end'],
+                job['frame_skip'],
+                report,
+                written
+            )
+            if 'FINISHED' not in result:
+                raise RuntimeError('render cancelled')
+            frames = ls_collect_job_frames(render_fp, written, b_checksums_only)
+            heartbeat.void_stop()
+            var_job_server_request(server_url, '/complete', {'lease_id': lease_id, 'frames': frames})
+            print(f'INFO: Job {job["id"]} completed with {len(frames)} files.')
+        except Exception as e:
+            heartbeat.void_stop()
+            print(f'WARNING: Job {job["id"]} failed: {e}')
+            try:
+                var_job_server_request(server_url, '/fail', {'lease_id': lease_id, 'error': str(e)})
+            except (urllib.error.URLError, OSError):
+                pass
+        finally:
+            if tmp_filepath:
+                shutil.rmtree(tmp_filepath, ignore_errors=True)
+
 # Addon Properties
 
 class SPRSHTT_PropertyGroup(PropertyGroup):
@@ -301,6 +1051,63 @@ class SPRSHTT_PropertyGroup(PropertyGroup):
         description = 'Use external script to process mask-map and colliders (requires PIL)',
         )
 
+    bool_pass_normal: BoolProperty(
+        name='Normal',
+        description = 'Also write normal pass alongside each rendered sprite',
+        default=False,
+        )
+
+    bool_pass_depth: BoolProperty(
+        name='Depth',
+        description = 'Also write depth pass (mapped to camera clipping range) alongside each rendered sprite',
+        default=False,
+        )
+
+    bool_pass_emission: BoolProperty(
+        name='Emission',
+        description = 'Also write emission pass alongside each rendered sprite',
+        default=False,
+        )
+
+    bool_pass_id_mask: BoolProperty(
+        name='ID Mask',
+        description = 'Also write target object index mask alongside each rendered sprite (Cycles only)',
+        default=False,
+        )
+
+    enum_frame_codec: EnumProperty(
+        name='Frame Storage',
+        description = 'How rendered frame sequences are stored',
+        items = [
+            ("IMAGE", "Images", "Store every frame as a full image", 1),
+            ("DELTA", "Delta Tiles", "Store keyframes and changed tiles only (8 bit PNG output only)", 2),
+        ],
+        default="IMAGE",
+        )
+
+    int_delta_tile_size: IntProperty(
+        name='Tile Size',
+        description = 'Tile size in pixels used to compare consecutive frames',
+        default=16,
+        min=4,
+        soft_max=64,
+        max=256,
+        )
+
+    int_delta_keyframe_interval: IntProperty(
+        name='Keyframe Interval',
+        description = 'Store a full frame every n frames',
+        default=8,
+        min=1,
+        soft_max=64,
+        )
+
+    bool_export_metadata: BoolProperty(
+        name='Export Sprite Metadata',
+        description = 'Write TexturePacker and Aseprite json (trim rect, pivot, frame duration, direction tags) while rendering',
+        default=False,
+        )
+
     bool_existing_camera: BoolProperty(
         name='Use Existing Camera',
         description = 'Use existing camera instead of generated from these settings',
@@ -432,6 +1239,24 @@ class SPRSHTT_PropertyGroup(PropertyGroup):
         update=void_callback_on_increment_prop_update
     )
 
+    int_draft_key_frames: IntProperty(
+        name='Key Frames',
+        description = 'Number of evenly spaced frames rendered per direction in draft preview',
+        default=3,
+        min=1,
+        soft_max=8,
+        max=32,
+        )
+
+    int_draft_resolution_percentage: IntProperty(
+        name='Draft Resolution',
+        description = 'Render resolution percentage used in draft preview',
+        default=25,
+        min=1,
+        max=100,
+        subtype='PERCENTAGE',
+        )
+
     bool_auto_camera_offset: BoolProperty(
         name='Auto Offset', 
         description = 'Automatically set distance by object bounding-box size',
@@ -452,6 +1277,20 @@ class SPRSHTT_PropertyGroup(PropertyGroup):
         default=False,
         )
 
+    str_job_server_url: StringProperty(
+        name='Job Server',
+        description = 'Job server address render jobs are submitted to',
+        default='http://localhost:8765'
+        )
+
+    int_job_frame_chunk: IntProperty(
+        name='Frames per Job',
+        description = 'Number of rendered frames per job, 0 renders a whole direction per job',
+        default=0,
+        min=0,
+        soft_max=250,
+        )
+
     collection_target_objects: PointerProperty(
         type=bpy.types.Object, 
         poll=lambda s, x: x.type == 'MESH',
@@ -569,72 +1408,167 @@ class SPRSHTT_OP_DeleteAllAddonObjects(Operator):
         return {'FINISHED'}
 
 
-class SPRSHTT_OP_Render(Operator):
-    bl_idname = "object.sprshtt_render"
-    bl_label = "Do you really want to do that?"
-    bl_options = {'REGISTER', 'INTERNAL'} # internal option removes operator from blender search
+class SPRSHTT_OP_RenderDraftPreview(Operator):
+    """ Renders all directions at a few key frames with Workbench into one contact sheet """
+    bl_idname = 'object.sprshtt_render_draft_preview'
+    bl_label = "Render Draft Contact Sheet"
+
+    SHEET_IMAGE_NAME = 'sprshtt_draft_contact_sheet'
 
     @classmethod
     def poll(cls, context):
-        return True
+        addon_prop = context.scene.sprshtt_properties
+        return bool(addon_prop.collection_target_objects) and bool(addon_prop.collection_target_cameras)
 
     def execute(self, context):
         scene = context.scene
         addon_prop = scene.sprshtt_properties
+        time_start = perf_counter()
 
-        target_name = addon_prop.collection_target_objects.name
-        render_subfolder = addon_prop.str_export_folder
-        render_file_suffix = addon_prop.str_file_suffix
-        render_file_format = scene.render.image_settings.file_format
-        render_fp = abspath(scene.render.filepath)
-        render_fp = native_pathsep(render_fp)
+        frame_skip = addon_prop.int_frame_skip
+        if not addon_prop.bool_frame_skip:
+            frame_skip = 1
 
-        bitmap_file_formats = ['PNG', 'BMP', 'JPEG', 'JPEG2000', 'TARGA', 'TARGA_RAW', 'IRIS']
-        if render_file_format not in bitmap_file_formats:
-            self.report({'INFO'}, f'File format not supported: {render_file_format}')
+        directions = addon_prop.int_camera_rotation_increment_limit
+        frames = ls_key_frames(scene.frame_start, scene.frame_end, frame_skip, addon_prop.int_draft_key_frames)
+        if not frames:
+            self.report({'INFO'}, 'Frame range renders no frames')
             return {'CANCELLED'}
 
-        if not render_file_suffix:
-            render_file_suffix = target_name
-        render_file_suffix = clean_name(render_file_suffix)
+        saved = ls_save_attributes([
+            (scene.render, 'engine'),
+            (scene.render, 'resolution_percentage'),
+            (scene.render, 'film_transparent'),
+            (scene.render, 'use_compositing'),
+            (scene.render.image_settings, 'file_format'),
+            (scene.render.image_settings, 'color_mode'),
+            (scene.display, 'render_aa'),
+            (scene, 'frame_current'),
+            (addon_prop, 'int_camera_rotation_preview'),
+        ])
+
+        scene.render.engine = 'BLENDER_WORKBENCH'
+        scene.render.resolution_percentage = addon_prop.int_draft_resolution_percentage
+        scene.render.film_transparent = True
+        scene.render.use_compositing = False
+        scene.render.image_settings.file_format = 'PNG'
+        scene.render.image_settings.color_mode = 'RGBA'
+        scene.display.render_aa = 'OFF'
+
+        tmp_filepath = tempfile.mkdtemp(prefix='sprshtt_draft_')
+
+        tiles = []
+        try:
+            for inc in range(directions):
+                addon_prop.int_camera_rotation_preview = inc
+                row = []
+                for frame in frames:
+                    scene.frame_current = frame
+                    filename = f'd{inc:02}_f{frame:06}.png'
+                    render_to_path(context, tmp_filepath, filename)
+                    row.append(arr_load_image_pixels(os.path.join(tmp_filepath, filename)))
+                tiles.append(row)
+        finally:
+            void_load_attributes(saved)
+            shutil.rmtree(tmp_filepath, ignore_errors=True)
+
+        # first direction on top row, blender images are stored bottom row first
+        sheet = np.concatenate([np.concatenate(row, axis=1) for row in reversed(tiles)], axis=0)
+        height, width, _ = sheet.shape
+
+        img = bpy.data.images.get(self.SHEET_IMAGE_NAME)
+        if img and tuple(img.size) != (width, height):
+            bpy.data.images.remove(img)
+            img = None
+        if not img:
+            img = bpy.data.images.new(self.SHEET_IMAGE_NAME, width, height, alpha=True)
+        void_set_image_pixels(img, sheet)
+        img.update()
+        if img.preview:
+            img.preview.reload()
+
+        self.report({'INFO'}, f'Draft preview {directions}x{len(frames)} rendered in {perf_counter() - time_start:.2f}s')
+        return {'FINISHED'}
+
 
-        if render_subfolder:
-            render_subfolder = native_pathsep(render_subfolder).lstrip(os.path.sep)
-            render_fp = os.path.join(render_fp, render_subfolder)
-            if not os.path.isdir(render_fp):
-                os.mkdir(render_fp)
-                self.report({'INFO'}, f'Created new folder {render_fp}')
+class SPRSHTT_OP_SubmitRenderJobs(Operator):
+    """ Submits current render setup onto job server as per-direction jobs """
+    bl_idname = 'object.sprshtt_submit_render_jobs'
+    bl_label = "Submit Render Jobs"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(bpy.data.filepath) and bool(context.scene.sprshtt_properties.collection_target_objects)
+
+    def execute(self, context):
+        scene = context.scene
+        addon_prop = scene.sprshtt_properties
+
+        if bpy.data.is_dirty:
+            self.report({'ERROR'}, 'Unsaved changes are not seen by workers, save the blend file first')
+            return {'CANCELLED'}
+
+        if addon_prop.enum_frame_codec == 'DELTA' and addon_prop.int_job_frame_chunk > 0:
+            # each chunk would write its own delta index over the others
+            self.report({'ERROR'}, 'Delta tile storage needs whole directions per job, set Frames per Job to 0')
+            return {'CANCELLED'}
 
-        frame_start = scene.frame_start
-        frame_end = scene.frame_end
-        frame_range = frame_end - frame_start
         frame_skip = addon_prop.int_frame_skip
         if not addon_prop.bool_frame_skip:
             frame_skip = 1
 
-        render_sub_sub_folder = os.path.join(render_fp, render_file_suffix)
-        if not os.path.isdir(render_sub_sub_folder):
-            os.mkdir(render_sub_sub_folder)
-            self.report({'INFO'}, f'Created new folder {render_sub_sub_folder}')
-        
-        for inc in range(addon_prop.int_camera_rotation_increment_limit):
-            addon_prop.int_camera_rotation_preview = inc
-            curr_angle = inc*360//addon_prop.int_camera_rotation_increment_limit
+        directions = addon_prop.int_camera_rotation_increment_limit
+        # server splits each direction into frame chunks
+        jobs = [
+            {
+                'blend': abspath(bpy.data.filepath),
+                'target': addon_prop.collection_target_objects.name,
+                'direction': inc,
+                'directions': directions,
+                'frame_start': scene.frame_start,
+                'frame_end': scene.frame_end,
+                'frame_skip': frame_skip,
+                'chunk': addon_prop.int_job_frame_chunk,
+            }
+            for inc in range(directions)
+        ]
+
+        try:
+            response = var_job_server_request(addon_prop.str_job_server_url, '/jobs', {'jobs': jobs})
+        except (urllib.error.URLError, OSError) as e:
+            self.report({'ERROR'}, f'Job server unreachable: {e}')
+            return {'CANCELLED'}
 
-            render_sub_sub_sub_folder = os.path.join(render_sub_sub_folder, f'd{curr_angle:03}_{render_file_suffix}')
+        self.report({'INFO'}, f'Submitted {len(response["ids"])} jobs to {addon_prop.str_job_server_url}')
+        return {'FINISHED'}
 
-            if not os.path.isdir(render_sub_sub_sub_folder):
-                os.mkdir(render_sub_sub_sub_folder)
-                self.report({'INFO'}, f'Created new folder {render_sub_sub_sub_folder}')
 
-            frame = frame_start
-            while frame < frame_end:
-                scene.frame_current = frame
-                frame += frame_skip
-                filename = f'f{frame:06}.{render_file_format.lower()}'
-                render_to_path(context, render_sub_sub_sub_folder, filename)
+class SPRSHTT_OP_Render(Operator):
+    bl_idname = "object.sprshtt_render"
+    bl_label = "Do you really want to do that?"
+    bl_options = {'REGISTER', 'INTERNAL'} # internal option removes operator from blender search
 
-        return {'FINISHED'}
+    @classmethod
+    def poll(cls, context):
+        return True
+
+    def execute(self, context):
+        scene = context.scene
+        addon_prop = scene.sprshtt_properties
+
+        frame_skip = addon_prop.int_frame_skip
+        if not addon_prop.bool_frame_skip:
+            frame_skip = 1
+
+        return set_render_directions(
+            context,
+            native_pathsep(abspath(scene.render.filepath)),
+            range(addon_prop.int_camera_rotation_increment_limit),
+            scene.frame_start,
+            scene.frame_end,
+            frame_skip,
+            self.report
+        )
 
     def invoke(self, context, event):
         context.window_manager.invoke_confirm(self, event)
@@ -713,6 +1647,16 @@ class SPRSHTT_PT_render_panel_renderer(SPRSHTT_Panel_baseProps, Panel):
         subcol.enabled = bool(addon_prop.collection_target_cameras)
         subcol.prop(addon_prop, 'int_camera_rotation_preview', text='Preview')
 
+        subcol = col.column(align=True)
+        subcol.enabled = bool(addon_prop.collection_target_objects) and bool(addon_prop.collection_target_cameras)
+        subrow = subcol.row(align=True)
+        subrow.prop(addon_prop, 'int_draft_key_frames')
+        subrow.prop(addon_prop, 'int_draft_resolution_percentage')
+        subcol.operator('object.sprshtt_render_draft_preview', text='Draft Preview')
+        sheet_img = bpy.data.images.get(SPRSHTT_OP_RenderDraftPreview.SHEET_IMAGE_NAME)
+        if sheet_img:
+            subcol.template_icon(icon_value=layout.icon(sheet_img), scale=10)
+
         col.prop(addon_prop, 'bool_frame_skip')
         subcol = col.column()
         if addon_prop.bool_frame_skip:
@@ -732,10 +1676,29 @@ class SPRSHTT_PT_render_panel_output(SPRSHTT_Panel_baseProps, Panel):
         col.prop(addon_prop, 'str_file_suffix')
         col.prop(addon_prop, 'bool_post_processing')
 
+        col.prop(addon_prop, 'bool_export_metadata')
+        col.prop(addon_prop, 'enum_frame_codec')
+        if addon_prop.enum_frame_codec == 'DELTA':
+            subrow = col.row(align=True)
+            subrow.prop(addon_prop, 'int_delta_tile_size')
+            subrow.prop(addon_prop, 'int_delta_keyframe_interval')
+
+        col.label(text='Extra Passes')
+        subrow = col.row(align=True)
+        subrow.prop(addon_prop, 'bool_pass_normal', toggle=True)
+        subrow.prop(addon_prop, 'bool_pass_depth', toggle=True)
+        subrow.prop(addon_prop, 'bool_pass_emission', toggle=True)
+        subrow.prop(addon_prop, 'bool_pass_id_mask', toggle=True)
+
         subcol = col.column()
         subcol.enabled = bool(addon_prop.collection_target_cameras)
         subcol.operator('object.sprshtt_render', text='Render')
 
+        col.separator()
+        col.prop(addon_prop, 'str_job_server_url')
+        col.prop(addon_prop, 'int_job_frame_chunk')
+        col.operator('object.sprshtt_submit_render_jobs', text='Submit to Job Server')
+
 
 # Addon Register/Unregister
 
@@ -746,7 +1709,9 @@ classes = (
     SPRSHTT_PT_render_panel_output, 
     SPRSHTT_OP_CreateHelperObject,
     SPRSHTT_OP_CreateCamera,
+    SPRSHTT_OP_RenderDraftPreview,
     SPRSHTT_OP_Render,
+    SPRSHTT_OP_SubmitRenderJobs,
     SPRSHTT_OP_DeleteAllAddonObjects,
     SPRSHTT_PropertyGroup,
 )
@@ -762,4 +1727,14 @@ def unregister():
     delattr(Scene, 'sprshtt_properties')
 
 if __name__ == '__main__':
-    register()
\ No newline at end of file
+    register()
+
+    # worker mode: blender -b scene.blend --python <this file> -- --sprshtt-worker <server url>
+    #   [--sprshtt-checksums-only] [--sprshtt-blend-root <folder holding blend files>]
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    if '--sprshtt-worker' in argv:
+        void_run_job_worker(
+            argv[argv.index('--sprshtt-worker') + 1],
+            b_checksums_only='--sprshtt-checksums-only' in argv,
+            blend_root=argv[argv.index('--sprshtt-blend-root') + 1] if '--sprshtt-blend-root' in argv else ''
+        )
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import argparse
+import tempfile
+import threading
+import unittest
+import urllib.error
+import importlib.util
+
+
+SERVER_FILEPATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sprite-sheet-job-server.py')
+spec = importlib.util.spec_from_file_location('sprite_sheet_job_server', SERVER_FILEPATH)
+job_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(job_server)
+
+
+def frame_entry(name: str, data: bytes, checksum: str = None) -> dict:
+    return {
+        'name': name,
+        'sha256': checksum or hashlib.sha256(data).hexdigest(),
+        'data': base64.b64encode(data).decode('ascii'),
+    }
+
+def texturepacker_fragment(tag: str, angle: int, frame_names: list) -> bytes:
+    frames = {name: {'frame': {'x': 0, 'y': 0, 'w': 8, 'h': 8}} for name in frame_names}
+    return json.dumps({
+        'frames': frames,
+        'animations': {tag: frame_names},
+        'meta': {'size': {'w': 8, 'h': 8}, 'directions': {tag: angle}},
+    }).encode('utf-8')
+
+def aseprite_fragment(tag: str, angle: int, frame_names: list) -> bytes:
+    frames = {name: {'frame': {'x': 0, 'y': 0, 'w': 8, 'h': 8}, 'duration': 83} for name in frame_names}
+    return json.dumps({
+        'frames': frames,
+        'meta': {
+            'size': {'w': 8, 'h': 8},
+            'frameTags': [{'name': tag, 'from': 0, 'to': len(frame_names) - 1, 'direction': 'forward', 'data': f'angle={angle}'}],
+            'slices': [{'name': 'pivot', 'color': '#0000ffff', 'keys': [
+                {'frame': i, 'bounds': {'x': 0, 'y': 0, 'w': 8, 'h': 8}, 'pivot': {'x': 4, 'y': i}}
+                for i in range(len(frame_names))
+            ]}],
+        },
+    }).encode('utf-8')
+
+
+class JobServerTestCase(unittest.TestCase):
+
+    lease_timeout = 30
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_filepath = self.tmp_dir.name
+        self.queue = job_server.JobQueue(self.output_filepath, self.lease_timeout, max_attempts=3)
+        self.server = job_server.var_make_server('127.0.0.1', 0, self.queue)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def request(self, route: str, payload: dict = None):
+        """ Returns (http status, json response) """
+        try:
+            return 200, job_server.var_request(self.url, route, payload)
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read().decode('utf-8'))
+
+    def submit(self, directions: int = 1, frame_start: int = 1, frame_end: int = 5, frame_skip: int = 1, chunk: int = 0):
+        jobs = [
+            {
+                'blend': 'scene.blend',
+                'target': 'Cube',
+                'direction': direction,
+                'directions': directions,
+                'frame_start': frame_start,
+                'frame_end': frame_end,
+                'frame_skip': frame_skip,
+                'chunk': chunk,
+            }
+            for direction in range(directions)
+        ]
+        return self.request('/jobs', {'jobs': jobs})[1]['ids']
+
+    def status(self):
+        return self.request('/status')[1]
+
+
+class TestJobQueue(JobServerTestCase):
+
+    def test_frame_chunks_follow_render_loop(self):
+        self.assertEqual(job_server.ls_job_frame_chunks(1, 11, 2, 2), [(1, 5), (5, 9), (9, 11)])
+        self.assertEqual(job_server.ls_job_frame_chunks(1, 11, 2, 0), [(1, 11)])
+        self.assertEqual(job_server.ls_job_frame_chunks(1, 1, 1, 0), [])
+        self.assertEqual(job_server.ls_job_frame_chunks(1, 1, 1, 3), [])
+
+    def test_submit_splits_chunks(self):
+        ids = self.submit(directions=2, frame_start=1, frame_end=11, frame_skip=2, chunk=2)
+        self.assertEqual(len(ids), 6)
+
+    def test_local_workers_drain_queue(self):
+        self.submit(directions=4, frame_start=1, frame_end=21, frame_skip=2, chunk=3)
+        workers = [
+            threading.Thread(target=job_server.void_cmd_dry_worker, args=(argparse.Namespace(url=self.url, name=f'w{i}', delay=0),))
+            for i in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        status = self.status()
+        self.assertEqual(status['counts']['done'], 16)
+        self.assertEqual(status['remaining'], 0)
+        self.assertTrue(all(job['worker'] for job in status['jobs']))
+        n_files = sum(len(filenames) for _, _, filenames in os.walk(self.output_filepath))
+        self.assertEqual(n_files, 4 * 10)
+
+    def test_stale_lease_complete_rejected(self):
+        self.submit()
+        code, _ = self.request('/complete', {'lease_id': 'unknown', 'frames': []})
+        self.assertEqual(code, 409)
+
+    def test_checksum_mismatch_requeues(self):
+        self.submit()
+        lease = self.request('/lease', {'worker': 'w'})[1]
+        code, response = self.request('/complete', {
+            'lease_id': lease['lease_id'],
+            'frames': [frame_entry('Cube/f000001.png', b'data', checksum='0' * 64)],
+        })
+        self.assertEqual(code, 400)
+        self.assertIn('checksum mismatch', response['error'])
+
+        job = self.status()['jobs'][0]
+        self.assertEqual(job['status'], job_server.JOB_STATUS_PENDING)
+        self.assertEqual(job['attempts'], 1)
+        self.assertEqual(self.request('/lease', {'worker': 'w'})[1]['job']['id'], job['id'])
+
+    def test_parent_frame_name_rejected(self):
+        self.submit()
+        lease = self.request('/lease', {'worker': 'w'})[1]
+        code, _ = self.request('/complete', {
+            'lease_id': lease['lease_id'],
+            'frames': [frame_entry('../escape.png', b'data')],
+        })
+        self.assertEqual(code, 400)
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.output_filepath), 'escape.png')))
+        self.assertEqual(self.status()['jobs'][0]['status'], job_server.JOB_STATUS_PENDING)
+
+    def test_malformed_frame_entry_responds(self):
+        self.submit()
+        lease = self.request('/lease', {'worker': 'w'})[1]
+        code, _ = self.request('/complete', {'lease_id': lease['lease_id'], 'frames': ['not a frame']})
+        self.assertEqual(code, 400)
+        self.assertEqual(self.status()['jobs'][0]['status'], job_server.JOB_STATUS_PENDING)
+
+    def test_failed_job_marked_after_max_attempts(self):
+        self.submit()
+        for _ in range(3):
+            lease = self.request('/lease', {'worker': 'w'})[1]
+            self.assertEqual(self.request('/fail', {'lease_id': lease['lease_id'], 'error': 'boom'})[0], 200)
+        status = self.status()
+        self.assertEqual(status['counts']['failed'], 1)
+        self.assertEqual(status['remaining'], 0)
+        self.assertIsNone(self.request('/lease', {'worker': 'w'})[1]['job'])
+
+    def test_metadata_merge_ordering(self):
+        # two directions split in two chunks, completed out of order by separate clients
+        self.submit(directions=2, frame_start=1, frame_end=5, frame_skip=1, chunk=2)
+        uploads = {}
+        for direction, angle in ((0, 0), (1, 180)):
+            tag = f'd{angle:03}_x'
+            for frame_start, frames in ((1, [2, 3]), (3, [4, 5])):
+                names = [f'{tag}/f{frame:06}.png' for frame in frames]
+                stem = f'export/x/x_d{direction:02}_f{frame_start:06}'
+                uploads[(direction, frame_start)] = [
+                    frame_entry(stem + '.json', texturepacker_fragment(tag, angle, names)),
+                    frame_entry(stem + '.aseprite.json', aseprite_fragment(tag, angle, names)),
+                ]
+
+        leases = [self.request('/lease', {'worker': f'w{i}'})[1] for i in range(4)]
+        for lease in reversed(leases):
+            job = lease['job']
+            code, _ = self.request('/complete', {
+                'lease_id': lease['lease_id'],
+                'frames': uploads[(job['direction'], job['frame_start'])],
+            })
+            self.assertEqual(code, 200)
+
+        expected = [f'd{angle:03}_x/f{frame:06}.png' for angle in (0, 180) for frame in (2, 3, 4, 5)]
+        with open(os.path.join(self.output_filepath, 'export', 'x', 'x.json')) as f:
+            texturepacker = json.load(f)
+        self.assertEqual(list(texturepacker['frames']), expected)
+        self.assertEqual(texturepacker['animations']['d180_x'], expected[4:])
+        self.assertEqual(texturepacker['meta']['directions'], {'d000_x': 0, 'd180_x': 180})
+
+        with open(os.path.join(self.output_filepath, 'export', 'x', 'x.aseprite.json')) as f:
+            aseprite = json.load(f)
+        self.assertEqual(list(aseprite['frames']), expected)
+        self.assertEqual(
+            [(tag['name'], tag['from'], tag['to']) for tag in aseprite['meta']['frameTags']],
+            [('d000_x', 0, 3), ('d180_x', 4, 7)]
+        )
+        keys = aseprite['meta']['slices'][0]['keys']
+        self.assertEqual([key['frame'] for key in keys], list(range(8)))
+        self.assertEqual([key['pivot']['y'] for key in keys], [0, 1, 0, 1, 0, 1, 0, 1])
+
+
+class TestJobLeaseExpiry(JobServerTestCase):
+
+    lease_timeout = 0.3
+
+    def test_lease_expiry_requeues(self):
+        self.submit()
+        lease = self.request('/lease', {'worker': 'dead'})[1]
+        self.assertEqual(self.request('/lease', {'worker': 'w'})[1]['job'], None)
+
+        time.sleep(self.lease_timeout * 2)
+        job = self.status()['jobs'][0]
+        self.assertEqual(job['status'], job_server.JOB_STATUS_PENDING)
+        self.assertEqual(job['error'], 'lease expired')
+
+        self.assertEqual(self.request('/heartbeat', {'lease_id': lease['lease_id']})[0], 409)
+        self.assertEqual(self.request('/lease', {'worker': 'w'})[1]['job']['id'], lease['job']['id'])
+
+    def test_heartbeat_keeps_lease(self):
+        self.submit()
+        lease = self.request('/lease', {'worker': 'w'})[1]
+        for _ in range(4):
+            time.sleep(self.lease_timeout / 2)
+            self.assertEqual(self.request('/heartbeat', {'lease_id': lease['lease_id']})[0], 200)
+        self.assertEqual(self.status()['jobs'][0]['status'], job_server.JOB_STATUS_LEASED)
+
+
+if __name__ == '__main__':
+    unittest.main()